@@ -38,7 +38,6 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'graphene_django',
-    'django_crontab',
     'crm'
 ]
 
@@ -125,15 +124,10 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 GRAPHENE = {
-    'SCHEMA': 'alx-backend-graphql_crm.schema.schema'
+    'SCHEMA': 'alx-backend-graphql_crm.schema.schema',
+    'MIDDLEWARE': [
+        'crm.loaders.LoaderMiddleware',
+    ],
 }
 
-# Django-crontab Configuration
-CRONJOBS = [
-    ('*/5 * * * *', 'crm.cron.log_crm_heartbeat'),
-    ('0 */12 * * *', 'crm.cron.update_low_stock'),
-]
-
-# Crontab settings
-CRONTAB_LOCK_JOBS = True
-CRONTAB_COMMAND_SUFFIX = '2>&1'
\ No newline at end of file
+# Scheduled jobs run in a single long-running process: python manage.py crmtick
\ No newline at end of file
@@ -1,33 +1,72 @@
 """
-Django-crontab job functions for CRM application heartbeat monitoring and stock management.
+Scheduled job functions for CRM application heartbeat monitoring and stock management.
+Run by the crmtick management command, which sets up Django once for all jobs.
 """
 
+import logging
 import os
-import sys
 from datetime import datetime
-from django.conf import settings
+from logging.handlers import RotatingFileHandler
 
-# Add the project directory to Python path for imports
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+GRAPHQL_ENDPOINT = "http://localhost:8000/graphql/"
+
+HEARTBEAT_LOG_FILE = '/tmp/crm_heartbeat_log.txt'
+LOW_STOCK_LOG_FILE = '/tmp/low_stock_updates_log.txt'
+
+def rotating_log(name, path, max_bytes=1_048_576, backup_count=5):
+    """
+    Return a logger that appends plain messages to path, rotating the file
+    once it grows past max_bytes and keeping backup_count old copies.
+    """
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+_heartbeat_log = rotating_log('crm.cron.heartbeat', HEARTBEAT_LOG_FILE)
+_low_stock_log = rotating_log('crm.cron.low_stock', LOW_STOCK_LOG_FILE)
+
+_GQL_SESSION = None
+_HELLO_Q = None
+
+def _get_graphql_session():
+    """
+    Return a connected GraphQL session for the HTTP heartbeat check.
+    The client and hello query are built on first use. The session stays
+    connected, so its requests session (and pooled connection) is reused
+    between ticks instead of being opened and closed on every execute.
+    """
+    global _GQL_SESSION, _HELLO_Q
+    if _GQL_SESSION is None:
+        from gql import gql, Client
+        from gql.transport.requests import RequestsHTTPTransport
+        
+        transport = RequestsHTTPTransport(
+            url=GRAPHQL_ENDPOINT,
+            timeout=10  # 10 second timeout
+        )
+        client = Client(transport=transport, fetch_schema_from_transport=False)
+        _HELLO_Q = gql("""
+            query {
+                hello
+            }
+        """)
+        _GQL_SESSION = client.connect_sync()
+    return _GQL_SESSION
 
 def log_crm_heartbeat():
     """
     Log a heartbeat message to confirm CRM application health.
-    Runs every 5 minutes via django-crontab.
+    Runs every 5 minutes via the crmtick management command.
     
     Logs format: DD/MM/YYYY-HH:MM:SS CRM is alive
     Also queries GraphQL hello field to verify endpoint responsiveness.
     """
     
-    # Configure Django settings if not already configured
-    if not settings.configured:
-        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crm.settings')
-        import django
-        django.setup()
-    
-    # Log file path
-    log_file = '/tmp/crm_heartbeat_log.txt'
-    
     # Format current timestamp as DD/MM/YYYY-HH:MM:SS
     timestamp = datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
     
@@ -39,137 +78,80 @@ def log_crm_heartbeat():
     
     # Prepare log message with GraphQL status
     if graphql_status:
-        log_message = f"{heartbeat_msg} - GraphQL endpoint responsive\n"
+        log_message = f"{heartbeat_msg} - GraphQL endpoint responsive"
     else:
-        log_message = f"{heartbeat_msg} - GraphQL endpoint unresponsive\n"
+        log_message = f"{heartbeat_msg} - GraphQL endpoint unresponsive"
     
-    # Append to log file
-    try:
-        with open(log_file, 'a') as f:
-            f.write(log_message)
-    except Exception as e:
-        # If logging fails, try to write to stderr
-        sys.stderr.write(f"Failed to write heartbeat log: {str(e)}\n")
+    # Append to log file; logging reports write failures on stderr
+    _heartbeat_log.info(log_message)
 
 def test_graphql_endpoint():
     """
     Test GraphQL endpoint responsiveness by querying the hello field.
     Returns True if endpoint is responsive, False otherwise.
+    
+    The query is executed in-process against the schema the server uses
+    (GRAPHENE['SCHEMA']). Set
+    CRM_HEARTBEAT_HTTP=1 to go through the HTTP endpoint instead.
     """
     try:
-
-        from gql import gql, Client
-        from gql.transport.requests import RequestsHTTPTransport
-        
-
-        transport = RequestsHTTPTransport(
-            url="http://localhost:8000/graphql",
-            timeout=10  # 10 second timeout
-        )
-        client = Client(transport=transport, fetch_schema_from_transport=False)
+        if os.environ.get('CRM_HEARTBEAT_HTTP') == '1':
+            session = _get_graphql_session()
+            result = session.execute(_HELLO_Q)
+            return bool(result and 'hello' in result)
         
-    
-        query = gql("""
-            query {
-                hello
-            }
-        """)
+        from graphene_django.settings import graphene_settings
         
-
-        result = client.execute(query)
+        result = graphene_settings.SCHEMA.execute('{ hello }')
         
-        if result and 'hello' in result:
+        if result.errors is None and result.data.get('hello'):
             return True
         else:
             return False
             
     except Exception as e:
 
-        error_msg = f"{datetime.now().strftime('%d/%m/%Y-%H:%M:%S')} GraphQL test error: {str(e)}\n"
-        try:
-            with open('/tmp/crm_heartbeat_log.txt', 'a') as f:
-                f.write(error_msg)
-        except:
-            pass  
+        _heartbeat_log.error(f"{datetime.now().strftime('%d/%m/%Y-%H:%M:%S')} GraphQL test error: {str(e)}")
         return False
 
 def update_low_stock():
     """
-    Update low stock products using GraphQL mutation.
-    Runs every 12 hours via django-crontab.
+    Update low stock products and log the results.
+    Runs every 12 hours via the crmtick management command.
     
-    Executes UpdateLowStockProducts mutation and logs results.
+    Calls the same service used by the UpdateLowStockProducts mutation
+    directly instead of going through the GraphQL endpoint.
     """
-    
-
-    if not settings.configured:
-        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crm.settings')
-        import django
-        django.setup()
-    
 
-    log_file = '/tmp/low_stock_updates_log.txt'
-    
 
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
     try:
-        from gql import gql, Client
-        from gql.transport.requests import RequestsHTTPTransport
+        from crm.services import update_low_stock_products
         
-        transport = RequestsHTTPTransport(
-            url="http://localhost:8000/graphql",
-            timeout=30  # 30 second timeout
-        )
-        client = Client(transport=transport, fetch_schema_from_transport=False)
+        result = update_low_stock_products()
         
-        mutation = gql("""
-            mutation {
-                updateLowStockProducts {
-                    success
-                    message
-                    updatedCount
-                    updatedProducts {
-                        id
-                        name
-                        stock
-                        sku
-                    }
-                }
-            }
-        """)
+
+        # Collect log lines and flush them as a single record
+        prefix = f"[{timestamp}] "
+        parts = [prefix + "Low stock update job started"]
         
-        result = client.execute(mutation)
+        if result['success']:
+            parts.append(f"{prefix}{result['message']}")
+            parts.append(f"{prefix}Updated {result['updated_count']} products")
+            parts.extend(
+                f"{prefix}Product: {p.name} (ID: {p.id}) - New stock: {p.stock}"
+                for p in result['updated_products']
+            )
+        else:
+            parts.append(f"{prefix}ERROR: {result['message']}")
         
-        mutation_result = result['updateLowStockProducts']
+        parts.append(prefix + "Low stock update job completed")
         
-
-        with open(log_file, 'a') as f:
-            f.write(f"[{timestamp}] Low stock update job started\n")
-            
-            if mutation_result['success']:
-                f.write(f"[{timestamp}] {mutation_result['message']}\n")
-                f.write(f"[{timestamp}] Updated {mutation_result['updatedCount']} products\n")
-                
-                for product in mutation_result['updatedProducts']:
-                    product_name = product['name']
-                    new_stock = product['stock']
-                    product_sku = product['sku']
-                    f.write(f"[{timestamp}] Product: {product_name} (SKU: {product_sku}) - New stock: {new_stock}\n")
-                    
-            else:
-                f.write(f"[{timestamp}] ERROR: {mutation_result['message']}\n")
-            
-            f.write(f"[{timestamp}] Low stock update job completed\n")
+        _low_stock_log.info("\n".join(parts))
         
     except Exception as e:
-        error_msg = f"[{timestamp}] CRITICAL ERROR: Failed to update low stock products - {str(e)}\n"
-        try:
-            with open(log_file, 'a') as f:
-                f.write(error_msg)
-        except:
-
-            sys.stderr.write(error_msg)
+        _low_stock_log.error(f"[{timestamp}] CRITICAL ERROR: Failed to update low stock products - {str(e)}")
 
 
 def update_low_stock_direct():
@@ -178,46 +160,37 @@ def update_low_stock_direct():
     Use this as a fallback if GraphQL endpoint is unavailable.
     """
 
-    if not settings.configured:
-        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crm.settings')
-        import django
-        django.setup()
-    
-    from myapp.models import Product
+    from django.db.models import F
+    from django.utils import timezone
+    from crm.models import Product
     
-    log_file = '/tmp/low_stock_updates_log.txt'
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
     try:
 
+        # Restock every low stock product with a single UPDATE statement
         low_stock_products = Product.objects.filter(stock__lt=10)
+        ids = list(low_stock_products.values_list('id', flat=True))
+        Product.objects.filter(id__in=ids).update(stock=F('stock') + 10, updated_at=timezone.now())
         
-        updated_products = []
+        updated_products = list(Product.objects.filter(id__in=ids).values('id', 'name', 'stock'))
         
 
-        for product in low_stock_products:
-            old_stock = product.stock
-            product.stock += 10
-            product.save()
-            updated_products.append(product)
+        prefix = f"[{timestamp}] "
+        parts = [
+            prefix + "Low stock update job started (direct database)",
+            f"{prefix}Updated {len(updated_products)} products",
+        ]
+        parts.extend(
+            f"{prefix}Product: {p['name']} (ID: {p['id']}) - New stock: {p['stock']}"
+            for p in updated_products
+        )
+        parts.append(prefix + "Low stock update job completed")
         
-
-        with open(log_file, 'a') as f:
-            f.write(f"[{timestamp}] Low stock update job started (direct database)\n")
-            f.write(f"[{timestamp}] Updated {len(updated_products)} products\n")
-            
-            for product in updated_products:
-                f.write(f"[{timestamp}] Product: {product.name} (SKU: {product.sku}) - New stock: {product.stock}\n")
-            
-            f.write(f"[{timestamp}] Low stock update job completed\n")
+        _low_stock_log.info("\n".join(parts))
             
     except Exception as e:
-        error_msg = f"[{timestamp}] ERROR: Direct database update failed - {str(e)}\n"
-        try:
-            with open(log_file, 'a') as f:
-                f.write(error_msg)
-        except:
-            sys.stderr.write(error_msg)
+        _low_stock_log.error(f"[{timestamp}] ERROR: Direct database update failed - {str(e)}")
 
 
 def log_crm_heartbeat_simple():
@@ -225,12 +198,5 @@ def log_crm_heartbeat_simple():
     Simple version of heartbeat logging without GraphQL testing.
     Use this if GraphQL testing is not required.
     """
-    log_file = '/tmp/crm_heartbeat_log.txt'
     timestamp = datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
-    log_message = f"{timestamp} CRM is alive\n"
-    
-    try:
-        with open(log_file, 'a') as f:
-            f.write(log_message)
-    except Exception as e:
-        sys.stderr.write(f"Failed to write heartbeat log: {str(e)}\n")
\ No newline at end of file
+    _heartbeat_log.info(f"{timestamp} CRM is alive")
\ No newline at end of file
@@ -3,21 +3,26 @@
 """
 Order Reminders Script
 Queries GraphQL endpoint for pending orders within the last week and logs reminders.
+
+Run from the project root: python -m crm.cron_jobs.send_order_reminders
 """
 
 import os
 import sys
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from gql import gql, Client
 from gql.transport.requests import RequestsHTTPTransport
 
-def main():
+from crm.cron import rotating_log
 
-    GRAPHQL_ENDPOINT = "http://localhost:8000/graphql"
-    LOG_FILE = "/tmp/order_reminders_log.txt"
-    
+GRAPHQL_ENDPOINT = "http://localhost:8000/graphql/"
+LOG_FILE = "/tmp/order_reminders_log.txt"
+
+log = rotating_log('crm.order_reminders', LOG_FILE)
 
-    seven_days_ago = datetime.now() - timedelta(days=7)
+def main():
+
+    seven_days_ago = datetime.now(timezone.utc) - timedelta(days=7)
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
     try:
@@ -26,14 +31,12 @@ def main():
         client = Client(transport=transport, fetch_schema_from_transport=True)
         
 
+        # Pending orders from the last week are filtered server-side
         query = gql("""
-            query {
-                allOrders {
+            query($since: DateTime!) {
+                orders(status: "pending", since: $since) {
                     id
-                    status
-                    createdAt
                     customer {
-                        id
                         email
                     }
                 }
@@ -41,41 +44,32 @@ def main():
         """)
         
 
-        result = client.execute(query)
-        
-
-        pending_orders = []
-        for order in result['allOrders']:
-            order_date = datetime.fromisoformat(order['createdAt'].replace('Z', '+00:00'))
-            
-
-            if (order['status'] == 'pending' and 
-                order_date >= seven_days_ago.replace(tzinfo=order_date.tzinfo)):
-                pending_orders.append(order)
+        result = client.execute(query, variable_values={'since': seven_days_ago.isoformat()})
+        pending_orders = result['orders']
         
  
-        with open(LOG_FILE, 'a') as log:
-            log.write(f"[{timestamp}] Order reminders check started\n")
-            
-            if pending_orders:
-                for order in pending_orders:
-                    order_id = order['id']
-                    customer_email = order['customer']['email']
-                    log.write(f"[{timestamp}] Order ID: {order_id}, Customer Email: {customer_email}\n")
-                
-                log.write(f"[{timestamp}] Found {len(pending_orders)} pending orders requiring reminders\n")
-            else:
-                log.write(f"[{timestamp}] No pending orders found requiring reminders\n")
+        lines = [f"[{timestamp}] Order reminders check started"]
+        
+        if pending_orders:
+            for order in pending_orders:
+                order_id = order['id']
+                customer_email = order['customer']['email']
+                lines.append(f"[{timestamp}] Order ID: {order_id}, Customer Email: {customer_email}")
             
-            log.write(f"[{timestamp}] Order reminders check completed\n")
+            lines.append(f"[{timestamp}] Found {len(pending_orders)} pending orders requiring reminders")
+        else:
+            lines.append(f"[{timestamp}] No pending orders found requiring reminders")
+        
+        lines.append(f"[{timestamp}] Order reminders check completed")
+        
+        log.info("\n".join(lines))
         
    
         print("Order reminders processed!")
         
     except Exception as e:
 
-        with open(LOG_FILE, 'a') as log:
-            log.write(f"[{timestamp}] ERROR: {str(e)}\n")
+        log.error(f"[{timestamp}] ERROR: {str(e)}")
         
         print(f"Error processing order reminders: {str(e)}")
         sys.exit(1)
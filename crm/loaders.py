@@ -0,0 +1,40 @@
+from .models import Customer, Product
+
+
+class ModelLoader:
+    """
+    Request-scoped cache of model rows by id.
+
+    Repeated lookups of the same id within one request (for example aliased
+    fields) hit the database once. Distinct ids are still fetched one query
+    each, because the synchronous executor resolves fields one at a time.
+    """
+    model = None
+
+    def __init__(self):
+        self._cache = {}
+
+    def load(self, id):
+        key = str(id)
+        if key not in self._cache:
+            self._cache[key] = self.model.objects.filter(id=id).first()
+        return self._cache[key]
+
+
+class CustomerLoader(ModelLoader):
+    model = Customer
+
+
+class ProductLoader(ModelLoader):
+    model = Product
+
+
+class LoaderMiddleware:
+    """Graphene middleware that attaches fresh loaders to each request context"""
+
+    def resolve(self, next, root, info, **args):
+        context = info.context
+        if context is not None and not hasattr(context, 'customer_loader'):
+            context.customer_loader = CustomerLoader()
+            context.product_loader = ProductLoader()
+        return next(root, info, **args)
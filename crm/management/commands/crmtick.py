@@ -0,0 +1,58 @@
+"""
+Long-running scheduler for the CRM cron jobs.
+
+Django is set up once by manage.py and every job runs inside this process:
+
+    python manage.py crmtick
+"""
+
+import functools
+
+from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.triggers.cron import CronTrigger
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from crm.cron import log_crm_heartbeat, update_low_stock
+from crm.cron_jobs import send_order_reminders
+
+
+def with_fresh_connections(job):
+    """
+    Close stale database connections around a job.
+    Jobs run in long-lived worker threads, so without this a connection
+    dropped by a database restart or idle timeout would break every later tick.
+    """
+    @functools.wraps(job)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return job(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return wrapper
+
+
+def run_order_reminders():
+    """Run the order reminders script without letting sys.exit stop the scheduler"""
+    try:
+        send_order_reminders.main()
+    except SystemExit:
+        pass
+
+
+class Command(BaseCommand):
+    help = "Run the CRM heartbeat, low stock and order reminder jobs on a schedule"
+
+    def handle(self, *args, **options):
+        scheduler = BlockingScheduler()
+        scheduler.add_job(with_fresh_connections(log_crm_heartbeat), CronTrigger.from_crontab('*/5 * * * *'), id='crm_heartbeat')
+        scheduler.add_job(with_fresh_connections(update_low_stock), CronTrigger.from_crontab('0 */12 * * *'), id='low_stock')
+        scheduler.add_job(with_fresh_connections(run_order_reminders), CronTrigger.from_crontab('0 8 * * *'), id='order_reminders')
+
+        self.stdout.write("CRM scheduler started")
+        try:
+            scheduler.start()
+        except (KeyboardInterrupt, SystemExit):
+            scheduler.shutdown()
+            self.stdout.write("CRM scheduler stopped")
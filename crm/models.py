@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q, Sum
 from django.core.validators import RegexValidator
 from decimal import Decimal
 
@@ -23,26 +24,41 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Partial index covering only the rows the low stock restock job scans
+            models.Index(fields=['stock'], name='idx_prod_lowstock', condition=Q(stock__lt=10)),
+        ]
+
     def __str__(self):
         return f"{self.name} - ${self.price}"
 
 class Order(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('completed', 'Completed'),
+        ('cancelled', 'Cancelled'),
+    ]
+
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
     products = models.ManyToManyField(Product, related_name='orders')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     order_date = models.DateTimeField(auto_now_add=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='crm_order_status_created_idx'),
+        ]
+
     def calculate_total(self):
         """To calculate total amount based on associated products"""
-        return sum(product.price for product in self.products.all())
-
-    def save(self, *args, **kwargs):
-    
-        if not self.total_amount and self.pk:
-            self.total_amount = self.calculate_total()
-        super().save(*args, **kwargs)
+        total = self.products.aggregate(total=Sum('price'))['total'] or Decimal('0')
+        # SQLite sums decimals as floats, so round back to the field's precision
+        places = self._meta.get_field('total_amount').decimal_places
+        return total.quantize(Decimal(1).scaleb(-places))
 
     def __str__(self):
         return f"Order #{self.id} - {self.customer.name} - ${self.total_amount}"
\ No newline at end of file
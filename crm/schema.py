@@ -1,6 +1,7 @@
 import graphene
 from graphene_django import DjangoObjectType
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Sum, Count
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
 from decimal import Decimal
@@ -8,6 +9,9 @@ from datetime import datetime
 import re
 
 from .models import Customer, Product, Order
+from .services import update_low_stock_products
+
+_PHONE_RE = re.compile(r'^\+?1?\d{9,15}$|^\d{3}-\d{3}-\d{4}$')
 
 class CustomerType(DjangoObjectType):
     class Meta:
@@ -44,8 +48,20 @@ def validate_phone(phone):
     """Validate phone number format"""
     if not phone:
         return True
-    phone_pattern = r'^\+?1?\d{9,15}$|^\d{3}-\d{3}-\d{4}$'
-    return bool(re.match(phone_pattern, phone))
+    return bool(_PHONE_RE.match(phone))
+
+def _quick_email_ok(email):
+    """Cheap structural pre-check; only rejects emails validate_email would reject too"""
+    if len(email) > 320 or '@' not in email:
+        return False
+    user, domain = email.rsplit('@', 1)
+    if not user or not domain:
+        return False
+    if not domain.isascii():
+        # Leave non-ASCII domains to validate_email: some Django versions retry them
+        # via IDNA, which maps ideographic dots such as '。' to '.'
+        return True
+    return '.' in domain or domain == 'localhost' or domain.startswith('[')
 
 def validate_customer_data(name, email, phone=None):
     """Validate customer data and return errors"""
@@ -56,6 +72,8 @@ def validate_customer_data(name, email, phone=None):
     
     if not email:
         errors.append("Email is required")
+    elif not _quick_email_ok(email):
+        errors.append("Invalid email format")
     else:
         try:
             validate_email(email)
@@ -83,20 +101,20 @@ class CreateCustomer(graphene.Mutation):
         if validation_errors:
             return CreateCustomer(errors=validation_errors)
         
-
-        if Customer.objects.filter(email=input.email).exists():
-            return CreateCustomer(errors=["Email already exists"])
-        
         try:
-            customer = Customer.objects.create(
-                name=input.name.strip(),
-                email=input.email.lower().strip(),
-                phone=input.get('phone', '').strip() if input.get('phone') else None
-            )
+            # The unique index on email rejects duplicates without a separate lookup
+            with transaction.atomic():
+                customer = Customer.objects.create(
+                    name=input.name.strip(),
+                    email=input.email.lower().strip(),
+                    phone=input.get('phone', '').strip() if input.get('phone') else None
+                )
             return CreateCustomer(
                 customer=customer,
                 message="Customer created successfully"
             )
+        except IntegrityError:
+            return CreateCustomer(errors=["Email already exists"])
         except Exception as e:
             return CreateCustomer(errors=[f"Failed to create customer: {str(e)}"])
 
@@ -108,42 +126,67 @@ class BulkCreateCustomers(graphene.Mutation):
     errors = graphene.List(graphene.String)
 
     def mutate(self, info, input):
-        successful_customers = []
+        new_customers = []
+        positions = {}
+        # (input position, message) pairs so errors are reported in input order
         all_errors = []
         
-        with transaction.atomic():
-            for i, customer_data in enumerate(input):
-                try:
-                    # Validate each customer
-                    validation_errors = validate_customer_data(
-                        customer_data.name, 
-                        customer_data.email, 
-                        customer_data.get('phone')
-                    )
-                    
-                    if validation_errors:
-                        all_errors.extend([f"Customer {i+1}: {error}" for error in validation_errors])
-                        continue
-                    
-
-                    if Customer.objects.filter(email=customer_data.email).exists():
-                        all_errors.append(f"Customer {i+1}: Email already exists")
-                        continue
-                    
+        emails = [c.email.lower().strip() for c in input if c.email]
+        existing = set(Customer.objects.filter(email__in=emails).values_list('email', flat=True))
+        
+        for i, customer_data in enumerate(input):
+            try:
+                # Validate each customer
+                validation_errors = validate_customer_data(
+                    customer_data.name, 
+                    customer_data.email, 
+                    customer_data.get('phone')
+                )
+                
+                if validation_errors:
+                    all_errors.extend([(i + 1, f"Customer {i+1}: {error}") for error in validation_errors])
+                    continue
+                
+                email = customer_data.email.lower().strip()
+                if email in existing:
+                    all_errors.append((i + 1, f"Customer {i+1}: Email already exists"))
+                    continue
+                
 
-                    customer = Customer.objects.create(
-                        name=customer_data.name.strip(),
-                        email=customer_data.email.lower().strip(),
-                        phone=customer_data.get('phone', '').strip() if customer_data.get('phone') else None
-                    )
-                    successful_customers.append(customer)
-                    
-                except Exception as e:
-                    all_errors.append(f"Customer {i+1}: {str(e)}")
+                existing.add(email)
+                positions[email] = i + 1
+                new_customers.append(Customer(
+                    name=customer_data.name.strip(),
+                    email=email,
+                    phone=customer_data.get('phone', '').strip() if customer_data.get('phone') else None
+                ))
+                
+            except Exception as e:
+                all_errors.append((i + 1, f"Customer {i+1}: {str(e)}"))
         
+        successful_customers = []
+        if new_customers:
+            try:
+                with transaction.atomic():
+                    successful_customers = Customer.objects.bulk_create(new_customers, batch_size=500)
+            except IntegrityError:
+                # An email was inserted concurrently after the lookup above;
+                # fall back to one savepoint per row to find which ones collided.
+                for customer in new_customers:
+                    try:
+                        with transaction.atomic():
+                            customer.save()
+                        successful_customers.append(customer)
+                    except IntegrityError:
+                        position = positions[customer.email]
+                        all_errors.append((position, f"Customer {position}: Email already exists"))
+            except Exception as e:
+                all_errors.append((len(input) + 1, f"Failed to create customers: {str(e)}"))
+        
+        all_errors.sort(key=lambda error: error[0])
         return BulkCreateCustomers(
             customers=successful_customers,
-            errors=all_errors
+            errors=[message for _, message in all_errors]
         )
 
 class CreateProduct(graphene.Mutation):
@@ -168,10 +211,15 @@ class CreateProduct(graphene.Mutation):
         if errors:
             return CreateProduct(errors=errors)
         
+        # graphene.Decimal already parses the price into a Decimal
+        price = input.price
+        if not isinstance(price, Decimal):
+            price = Decimal(str(price))
+        
         try:
             product = Product.objects.create(
                 name=input.name.strip(),
-                price=Decimal(str(input.price)),
+                price=price,
                 stock=input.stock if input.stock is not None else 0
             )
             return CreateProduct(product=product)
@@ -199,37 +247,60 @@ class CreateOrder(graphene.Mutation):
             errors.append("At least one product must be selected")
             return CreateOrder(errors=errors)
         
-        products = Product.objects.filter(id__in=input.product_ids)
-        if len(products) != len(input.product_ids):
-            found_ids = set(str(p.id) for p in products)
-            missing_ids = set(input.product_ids) - found_ids
+        product_ids = set(input.product_ids)
+        products = Product.objects.filter(id__in=product_ids)
+        agg = products.aggregate(total=Sum('price'), cnt=Count('id'))
+        if agg['cnt'] != len(product_ids):
+            found_ids = set(str(pk) for pk in products.values_list('id', flat=True))
+            missing_ids = product_ids - found_ids
             errors.append(f"Invalid product IDs: {', '.join(missing_ids)}")
             return CreateOrder(errors=errors)
         
         try:
             with transaction.atomic():
 
-                total_amount = sum(product.price for product in products)
+                # SQLite sums decimals as floats, so round back to the field's precision
+                total_places = Order._meta.get_field('total_amount').decimal_places
+                total_amount = agg['total'].quantize(Decimal(1).scaleb(-total_places))
                 
-
                 order = Order.objects.create(
                     customer=customer,
                     total_amount=total_amount,
                     order_date=input.order_date or datetime.now()
                 )
                 
-                order.products.set(products)
+                order.products.add(*product_ids)
                 
                 return CreateOrder(order=order)
                 
         except Exception as e:
             return CreateOrder(errors=[f"Failed to create order: {str(e)}"])
 
+class UpdateLowStockProducts(graphene.Mutation):
+    success = graphene.Boolean()
+    message = graphene.String()
+    updated_count = graphene.Int()
+    updated_products = graphene.List(ProductType)
+
+    def mutate(self, info):
+        try:
+            result = update_low_stock_products()
+            return UpdateLowStockProducts(**result)
+        except Exception as e:
+            return UpdateLowStockProducts(
+                success=False,
+                message=f"Failed to update low stock products: {str(e)}"
+            )
+
 class Query(graphene.ObjectType):
     hello = graphene.String()
     customers = graphene.List(CustomerType)
     products = graphene.List(ProductType)  
-    orders = graphene.List(OrderType)
+    orders = graphene.List(
+        OrderType,
+        status=graphene.String(required=False),
+        since=graphene.DateTime(required=False)
+    )
     customer = graphene.Field(CustomerType, id=graphene.ID(required=True))
     product = graphene.Field(ProductType, id=graphene.ID(required=True))
     order = graphene.Field(OrderType, id=graphene.ID(required=True))
@@ -243,24 +314,29 @@ class Query(graphene.ObjectType):
     def resolve_products(self, info):
         return Product.objects.all()
     
-    def resolve_orders(self, info):
-        return Order.objects.all()
+    def resolve_orders(self, info, status=None, since=None):
+        orders = Order.objects.select_related('customer').prefetch_related('products').all()
+        if status:
+            orders = orders.filter(status=status)
+        if since:
+            orders = orders.filter(created_at__gte=since)
+        return orders
     
     def resolve_customer(self, info, id):
-        try:
-            return Customer.objects.get(id=id)
-        except Customer.DoesNotExist:
-            return None
+        loader = getattr(info.context, 'customer_loader', None)
+        if loader is None:
+            return Customer.objects.filter(id=id).first()
+        return loader.load(id)
     
     def resolve_product(self, info, id):
-        try:
-            return Product.objects.get(id=id)
-        except Product.DoesNotExist:
-            return None
+        loader = getattr(info.context, 'product_loader', None)
+        if loader is None:
+            return Product.objects.filter(id=id).first()
+        return loader.load(id)
     
     def resolve_order(self, info, id):
         try:
-            return Order.objects.get(id=id)
+            return Order.objects.select_related('customer').prefetch_related('products').get(id=id)
         except Order.DoesNotExist:
             return None
 
@@ -268,4 +344,5 @@ class Mutation(graphene.ObjectType):
     create_customer = CreateCustomer.Field()
     bulk_create_customers = BulkCreateCustomers.Field()
     create_product = CreateProduct.Field()
-    create_order = CreateOrder.Field()
\ No newline at end of file
+    create_order = CreateOrder.Field()
+    update_low_stock_products = UpdateLowStockProducts.Field()
\ No newline at end of file
@@ -0,0 +1,24 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Product
+
+
+def update_low_stock_products(threshold=10, increment=10):
+    """Restock products whose stock is below threshold and return a summary"""
+    with transaction.atomic():
+        ids = list(Product.objects.filter(stock__lt=threshold).values_list('id', flat=True))
+        Product.objects.filter(id__in=ids).update(
+            stock=F('stock') + increment,
+            updated_at=timezone.now()
+        )
+
+    updated_products = list(Product.objects.filter(id__in=ids))
+
+    return {
+        'success': True,
+        'message': f"Restocked {len(updated_products)} low stock products",
+        'updated_count': len(updated_products),
+        'updated_products': updated_products,
+    }
@@ -1,3 +1,429 @@
+import os
+import re
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.triggers.cron import CronTrigger
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.validators import validate_email
 from django.test import TestCase
+from django.utils import timezone
+from graphene_django.settings import graphene_settings
+
+from .cron import log_crm_heartbeat, rotating_log, update_low_stock, update_low_stock_direct
+from .management.commands.crmtick import run_order_reminders, with_fresh_connections
+from .models import Customer, Order, Product
+from .schema import validate_customer_data, validate_phone
+
+
+def execute(query, variables=None):
+    """Execute a query against the schema the server uses"""
+    return graphene_settings.SCHEMA.execute(query, variable_values=variables)
+
+
+BULK_CREATE_CUSTOMERS = """
+    mutation($input: [CustomerInput]!) {
+        bulkCreateCustomers(input: $input) {
+            customers { id name email }
+            errors
+        }
+    }
+"""
+
+
+class BulkCreateCustomersTests(TestCase):
+    def bulk_create(self, customers):
+        result = execute(BULK_CREATE_CUSTOMERS, {'input': customers})
+        self.assertIsNone(result.errors)
+        return result.data['bulkCreateCustomers']
+
+    def test_creates_all_valid_customers(self):
+        data = self.bulk_create([
+            {'name': 'Alice', 'email': 'alice@example.com', 'phone': '+1234567890'},
+            {'name': 'Bob', 'email': 'Bob@Example.com'},
+        ])
+
+        self.assertEqual(data['errors'], [])
+        self.assertEqual([c['email'] for c in data['customers']], ['alice@example.com', 'bob@example.com'])
+        self.assertTrue(all(c['id'] for c in data['customers']))
+        self.assertEqual(Customer.objects.count(), 2)
+
+    def test_rejects_email_already_in_database(self):
+        Customer.objects.create(name='Alice', email='alice@example.com')
+
+        data = self.bulk_create([
+            {'name': 'Alice Again', 'email': 'ALICE@example.com'},
+            {'name': 'Bob', 'email': 'bob@example.com'},
+        ])
+
+        self.assertEqual(data['errors'], ['Customer 1: Email already exists'])
+        self.assertEqual([c['email'] for c in data['customers']], ['bob@example.com'])
+        self.assertEqual(Customer.objects.count(), 2)
+
+    def test_rejects_duplicate_email_within_batch(self):
+        data = self.bulk_create([
+            {'name': 'Alice', 'email': 'alice@example.com'},
+            {'name': 'Alice Twin', 'email': 'alice@example.com'},
+        ])
+
+        self.assertEqual(data['errors'], ['Customer 2: Email already exists'])
+        self.assertEqual([c['name'] for c in data['customers']], ['Alice'])
+        self.assertEqual(Customer.objects.count(), 1)
+
+    def test_mixed_invalid_rows_report_errors_in_input_order(self):
+        Customer.objects.create(name='Carol', email='carol@example.com')
+
+        data = self.bulk_create([
+            {'name': 'Alice', 'email': 'not-an-email'},
+            {'name': 'Bob', 'email': 'bob@example.com'},
+            {'name': 'Carol', 'email': 'carol@example.com'},
+            {'name': '', 'email': 'dave@example.com', 'phone': '12'},
+            {'name': 'Erin', 'email': 'erin@example.com'},
+        ])
+
+        self.assertEqual(data['errors'], [
+            'Customer 1: Invalid email format',
+            'Customer 3: Email already exists',
+            'Customer 4: Name is required',
+            'Customer 4: Invalid phone format. Use +1234567890 or 123-456-7890',
+        ])
+        self.assertEqual([c['name'] for c in data['customers']], ['Bob', 'Erin'])
+
+    def test_concurrent_insert_is_reported_for_the_colliding_row_only(self):
+        # bob@example.com is inserted by another request after the duplicate lookup ran
+        Customer.objects.create(name='Other Bob', email='bob@example.com')
+
+        with mock.patch.object(Customer.objects, 'filter', return_value=Customer.objects.none()):
+            data = self.bulk_create([
+                {'name': 'Alice', 'email': 'alice@example.com'},
+                {'name': 'Bob', 'email': 'bob@example.com'},
+                {'name': 'Carol', 'email': 'carol@example.com'},
+            ])
+
+        self.assertEqual(data['errors'], ['Customer 2: Email already exists'])
+        self.assertEqual([c['name'] for c in data['customers']], ['Alice', 'Carol'])
+        self.assertEqual(Customer.objects.get(email='bob@example.com').name, 'Other Bob')
+
+
+class CustomerLookupTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Alice', email='alice@example.com')
+
+    def test_resolves_without_request_loaders(self):
+        result = execute('query($id: ID!) { customer(id: $id) { name } }', {'id': self.customer.id})
+
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data['customer'], {'name': 'Alice'})
+
+    def test_repeated_lookups_in_one_request_hit_the_database_once(self):
+        query = 'query($id: ID!) { a: customer(id: $id) { name } b: customer(id: $id) { name } }'
+
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                '/graphql/',
+                {'query': query, 'variables': {'id': self.customer.id}},
+                content_type='application/json'
+            )
+
+        self.assertEqual(response.json()['data'], {'a': {'name': 'Alice'}, 'b': {'name': 'Alice'}})
+
+
+class ValidatePhoneTests(TestCase):
+    def test_accepts_documented_formats(self):
+        for phone in ['', None, '+1234567890', '1234567890', '+11234567890123', '123-456-7890']:
+            self.assertTrue(validate_phone(phone), phone)
+
+    def test_rejects_other_formats(self):
+        for phone in ['12345678', '+12-345-67890', '123-4567-890', '123 456 7890', 'phone']:
+            self.assertFalse(validate_phone(phone), phone)
+
+
+class ValidateCustomerEmailTests(TestCase):
+    def test_pre_check_agrees_with_validate_email(self):
+        emails = [
+            'alice@example.com', 'alice@localhost', 'alice@[127.0.0.1]', '"a@b"@example.com',
+            'a@example\u3002com', 'alice', 'alice@', '@example.com', 'alice@example',
+            'a' * 321 + '@example.com',
+        ]
+        for email in emails:
+            try:
+                validate_email(email)
+                expected = []
+            except ValidationError:
+                expected = ['Invalid email format']
+            self.assertEqual(validate_customer_data('Alice', email), expected, email)
+
+
+class OrdersQueryTests(TestCase):
+    def setUp(self):
+        customer = Customer.objects.create(name='Alice', email='alice@example.com')
+        self.recent_pending = Order.objects.create(customer=customer, total_amount=Decimal('10.00'))
+        self.old_pending = Order.objects.create(customer=customer, total_amount=Decimal('20.00'))
+        self.recent_completed = Order.objects.create(
+            customer=customer, total_amount=Decimal('30.00'), status='completed'
+        )
+        Order.objects.filter(pk=self.old_pending.pk).update(created_at=timezone.now() - timedelta(days=30))
+
+    def order_ids(self, arguments=''):
+        result = execute(f'{{ orders{arguments} {{ id }} }}')
+        self.assertIsNone(result.errors)
+        return {int(order['id']) for order in result.data['orders']}
+
+    def test_new_orders_default_to_pending(self):
+        self.assertEqual(self.recent_pending.status, 'pending')
+
+    def test_returns_all_orders_without_arguments(self):
+        self.assertEqual(
+            self.order_ids(),
+            {self.recent_pending.pk, self.old_pending.pk, self.recent_completed.pk}
+        )
+
+    def test_filters_by_status(self):
+        self.assertEqual(self.order_ids('(status: "pending")'), {self.recent_pending.pk, self.old_pending.pk})
+
+    def test_filters_by_status_and_since(self):
+        since = (timezone.now() - timedelta(days=7)).isoformat()
+        result = execute(
+            'query($since: DateTime!) { orders(status: "pending", since: $since) { id customer { email } } }',
+            {'since': since}
+        )
+
+        self.assertIsNone(result.errors)
+        self.assertEqual(
+            result.data['orders'],
+            [{'id': str(self.recent_pending.pk), 'customer': {'email': 'alice@example.com'}}]
+        )
+
+
+    def test_nested_customer_and_products_do_not_query_per_order(self):
+        products = [Product.objects.create(name=f'Item {i}', price=Decimal('1.00')) for i in range(3)]
+        for i in range(10):
+            customer = Customer.objects.create(name=f'Customer {i}', email=f'customer{i}@example.com')
+            order = Order.objects.create(customer=customer, total_amount=Decimal('3.00'))
+            order.products.add(*products)
+
+        # One query for orders joined with customers, one to prefetch products
+        with self.assertNumQueries(2):
+            result = execute('{ orders { id customer { email } products { name } } }')
+
+        self.assertIsNone(result.errors)
+        self.assertEqual(len(result.data['orders']), 13)
+        self.assertEqual(sum(len(order['products']) for order in result.data['orders']), 30)
+
+
+CREATE_ORDER = """
+    mutation($customerId: ID!, $productIds: [ID]!) {
+        createOrder(input: {customerId: $customerId, productIds: $productIds}) {
+            order { id totalAmount products { name } }
+            errors
+        }
+    }
+"""
+
+
+class CreateOrderTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Alice', email='alice@example.com')
+        self.laptop = Product.objects.create(name='Laptop', price=Decimal('999.99'), stock=5)
+        self.mouse = Product.objects.create(name='Mouse', price=Decimal('25.50'), stock=5)
+
+    def create_order(self, product_ids):
+        result = execute(CREATE_ORDER, {'customerId': self.customer.pk, 'productIds': product_ids})
+        self.assertIsNone(result.errors)
+        return result.data['createOrder']
+
+    def test_totals_the_selected_products(self):
+        data = self.create_order([self.laptop.pk, self.mouse.pk])
+
+        self.assertIsNone(data['errors'])
+        self.assertEqual(data['order']['totalAmount'], '1025.49')
+        order = Order.objects.get(pk=data['order']['id'])
+        self.assertEqual(order.total_amount, Decimal('1025.49'))
+        self.assertEqual(set(order.products.all()), {self.laptop, self.mouse})
+
+    def test_returned_total_keeps_two_decimal_places(self):
+        # 0.10 + 0.20 and 19.99 + 0.01 + 0.07 are not exact in binary floating point
+        cheap = [Product.objects.create(name=f'Item {price}', price=Decimal(price)) for price in ('0.10', '0.20')]
+        data = self.create_order([p.pk for p in cheap])
+        self.assertEqual(data['order']['totalAmount'], '0.30')
+
+        mixed = [Product.objects.create(name=f'Part {price}', price=Decimal(price)) for price in ('19.99', '0.01', '0.07')]
+        data = self.create_order([p.pk for p in mixed])
+        self.assertEqual(data['order']['totalAmount'], '20.07')
+
+    def test_duplicate_product_ids_are_counted_once(self):
+        data = self.create_order([self.laptop.pk, self.laptop.pk, self.mouse.pk])
+
+        self.assertIsNone(data['errors'])
+        order = Order.objects.get(pk=data['order']['id'])
+        self.assertEqual(order.total_amount, Decimal('1025.49'))
+        self.assertEqual(order.products.count(), 2)
+
+    def test_reports_missing_product_ids(self):
+        data = self.create_order([self.laptop.pk, 9999])
+
+        self.assertIsNone(data['order'])
+        self.assertEqual(data['errors'], ['Invalid product IDs: 9999'])
+        self.assertFalse(Order.objects.exists())
+
+
+class OrderCalculateTotalTests(TestCase):
+    def test_returns_a_two_place_decimal(self):
+        customer = Customer.objects.create(name='Alice', email='alice@example.com')
+        order = Order.objects.create(customer=customer, total_amount=Decimal('0.00'))
+        self.assertEqual(str(order.calculate_total()), '0.00')
+
+        order.products.add(*[
+            Product.objects.create(name=f'Part {price}', price=Decimal(price))
+            for price in ('19.99', '0.01', '0.07')
+        ])
+        self.assertEqual(str(order.calculate_total()), '20.07')
+
+
+class UpdateLowStockProductsTests(TestCase):
+    def test_restocks_only_low_stock_products(self):
+        low = Product.objects.create(name='Cable', price=Decimal('5.00'), stock=3)
+        stocked = Product.objects.create(name='Laptop', price=Decimal('999.99'), stock=50)
+
+        result = execute("""
+            mutation {
+                updateLowStockProducts {
+                    success
+                    updatedCount
+                    updatedProducts { id name stock price }
+                }
+            }
+        """)
+
+        self.assertIsNone(result.errors)
+        data = result.data['updateLowStockProducts']
+        self.assertTrue(data['success'])
+        self.assertEqual(data['updatedCount'], 1)
+        self.assertEqual(
+            data['updatedProducts'],
+            [{'id': str(low.pk), 'name': 'Cable', 'stock': 13, 'price': '5.00'}]
+        )
+        stocked.refresh_from_db()
+        self.assertEqual(stocked.stock, 50)
+
+
+class CrmTickCommandTests(TestCase):
+    def test_registers_the_three_jobs_on_their_schedules(self):
+        with mock.patch.object(BlockingScheduler, 'start', autospec=True) as start:
+            call_command('crmtick', stdout=StringIO())
+
+        scheduler = start.call_args[0][0]
+        jobs = {job.id: job for job in scheduler.get_jobs()}
+        expected = {
+            'crm_heartbeat': (log_crm_heartbeat, '*/5 * * * *'),
+            'low_stock': (update_low_stock, '0 */12 * * *'),
+            'order_reminders': (run_order_reminders, '0 8 * * *'),
+        }
+        self.assertEqual(set(jobs), set(expected))
+        for job_id, (func, crontab) in expected.items():
+            self.assertIs(jobs[job_id].func.__wrapped__, func)
+            self.assertEqual(str(jobs[job_id].trigger), str(CronTrigger.from_crontab(crontab)))
+
+    def test_with_fresh_connections_closes_connections_around_the_job(self):
+        calls = mock.Mock()
+        calls.job.return_value = 'done'
+        job = with_fresh_connections(calls.job)
+
+        with mock.patch('crm.management.commands.crmtick.close_old_connections', calls.close):
+            self.assertEqual(job(), 'done')
+
+        self.assertEqual(calls.mock_calls, [mock.call.close(), mock.call.job(), mock.call.close()])
+
+    def test_with_fresh_connections_closes_connections_when_the_job_raises(self):
+        calls = mock.Mock()
+        calls.job.side_effect = RuntimeError('database went away')
+        job = with_fresh_connections(calls.job)
+
+        with mock.patch('crm.management.commands.crmtick.close_old_connections', calls.close):
+            with self.assertRaises(RuntimeError):
+                job()
+
+        self.assertEqual(calls.mock_calls, [mock.call.close(), mock.call.job(), mock.call.close()])
+
+
+class CronJobLogTests(TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.log_dir.cleanup)
+
+    def capture(self, attribute):
+        """Point one of crm.cron's job loggers at a temp file and return its path"""
+        path = os.path.join(self.log_dir.name, f'{attribute}.txt')
+        logger = rotating_log(f'{self.id()}.{attribute}', path)
+        handler = logger.handlers[0]
+        self.addCleanup(logger.removeHandler, handler)
+        self.addCleanup(handler.close)
+        patcher = mock.patch(f'crm.cron.{attribute}', logger)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return path
+
+    def read_lines(self, path):
+        with open(path) as f:
+            content = f.read()
+        self.assertTrue(content.endswith('\n'))
+        self.assertNotIn('\n\n', content)
+        return content.splitlines()
+
+    def assert_stock_log(self, lines, expected_messages):
+        prefix = re.compile(r'^\[\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\] ')
+        stamps = {line[:21] for line in lines}
+        self.assertEqual(len(stamps), 1)
+        for line in lines:
+            self.assertRegex(line, prefix)
+        self.assertEqual([line[22:] for line in lines], expected_messages)
+
+    def test_update_low_stock_writes_one_line_per_entry(self):
+        path = self.capture('_low_stock_log')
+        cable = Product.objects.create(name='Cable', price=Decimal('5.00'), stock=3)
+        plug = Product.objects.create(name='Plug', price=Decimal('2.00'), stock=9)
+        Product.objects.create(name='Laptop', price=Decimal('999.99'), stock=50)
+
+        update_low_stock()
+
+        self.assert_stock_log(self.read_lines(path), [
+            'Low stock update job started',
+            'Restocked 2 low stock products',
+            'Updated 2 products',
+            f'Product: Cable (ID: {cable.pk}) - New stock: 13',
+            f'Product: Plug (ID: {plug.pk}) - New stock: 19',
+            'Low stock update job completed',
+        ])
+
+    def test_update_low_stock_direct_writes_one_line_per_entry(self):
+        path = self.capture('_low_stock_log')
+        cable = Product.objects.create(name='Cable', price=Decimal('5.00'), stock=3)
+
+        update_low_stock_direct()
+
+        self.assert_stock_log(self.read_lines(path), [
+            'Low stock update job started (direct database)',
+            'Updated 1 products',
+            f'Product: Cable (ID: {cable.pk}) - New stock: 13',
+            'Low stock update job completed',
+        ])
+
+    def test_heartbeat_writes_a_single_line(self):
+        path = self.capture('_heartbeat_log')
+
+        log_crm_heartbeat()
+        log_crm_heartbeat()
 
-# Create your tests here.
+        lines = self.read_lines(path)
+        self.assertEqual(len(lines), 2)
+        for line in lines:
+            self.assertRegex(
+                line,
+                r'^\d{2}/\d{2}/\d{4}-\d{2}:\d{2}:\d{2} CRM is alive - GraphQL endpoint responsive$'
+            )